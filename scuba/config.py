@@ -1,15 +1,24 @@
 from __future__ import annotations
+from collections import OrderedDict
+import copy
 import dataclasses
 import os
 from pathlib import Path
 import re
 import shlex
-from typing import Any, List, Dict, Optional, TextIO, Tuple, Type, TypeVar, Union
-from typing import overload
+import time
+from typing import Any, BinaryIO, List, Dict, Optional, Tuple, Type, TypeVar, Union
+from typing import NoReturn, overload
 
 import yaml
 import yaml.nodes
 
+try:
+    # Use the much faster libyaml-based parser, if available
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader  # type: ignore[assignment]
+
 from .constants import DEFAULT_SHELL, SCUBA_YML
 from . import utils
 from .dockerutil import make_vol_opt
@@ -19,8 +28,35 @@ CfgData = Dict[str, CfgNode]
 Environment = Dict[str, str]
 _T = TypeVar("_T")
 
+# Sentinel for a key which is absent from a mapping
+_MISSING = object()
+
+# Identifies a particular revision of a file: (absolute path, mtime, size)
+_DocKey = Tuple[str, int, int]
+
+# A loaded document: (keys of it and every document it references, document)
+_DocEntry = Tuple[Tuple[_DocKey, ...], Any]
+
+# File timestamps can be this coarse (e.g. FAT), so a file modified more
+# recently than this could be modified again without its mtime changing.
+_RACY_WINDOW_NS = 2_000_000_000
+
 VOLUME_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_.-]+$")
 
+# Use a negative look-behind to split a key on non-escaped '.' characters
+_KEY_SEP_PATTERN = re.compile(r"(?<!\\)\.")
+
+# Characters which need the full shlex tokenizer, and shlex's whitespace
+_SHLEX_QUOTING_PATTERN = re.compile(r"[\"'\\]")
+_SHLEX_TOKEN_PATTERN = re.compile(r"[^ \t\r\n]+")
+
+# Matches any text which might be more than a single-line plain YAML scalar,
+# or which the YAML reader would treat specially (anything but printable ASCII)
+_YAML_SYNTAX_PATTERN = re.compile(
+    r"^(?:[?\s]|-(?:\s|$)|---|\.\.\.)|[\t\r\n:#,\[\]{}&*!|>'\"%@`\\]|\s$"
+    r"|[^\x20-\x7e]"
+)
+
 
 class ConfigError(Exception):
     pass
@@ -56,15 +92,49 @@ class OverrideStr(str, OverrideMixin):
     pass
 
 
+def _split_args(s: str) -> List[str]:
+    """Split a string into arguments, like shlex.split()
+
+    Strings without any quotes or escapes (the common case) are split on
+    whitespace directly, without the overhead of the shlex tokenizer.
+    """
+    if _SHLEX_QUOTING_PATTERN.search(s):
+        return shlex.split(s)
+    return _SHLEX_TOKEN_PATTERN.findall(s)
+
+
+def _doc_key(path: Path) -> _DocKey:
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def _doc_is_racy(key: _DocKey) -> bool:
+    return time.time_ns() - key[1] <= _RACY_WINDOW_NS
+
+
 # http://stackoverflow.com/a/9577670
-class Loader(yaml.SafeLoader):
+class Loader(_SafeLoader):
     _root: Path  # directory containing the loaded document
-    _cache: Dict[Path, Any]  # document path => document
+    _deps: List[_DocKey]  # external documents this document was built from
+    _recent: Dict[str, _DocEntry]  # recently-modified documents, for this load only
 
-    def __init__(self, stream: TextIO):
+    # Loaded documents, shared by all loaders so that a file referenced from
+    # several places (or loaded several times) is parsed once.
+    # absolute path => (dependency keys, document)
+    _cache: OrderedDict[str, _DocEntry] = OrderedDict()
+    _CACHE_SIZE = 64
+
+    def __init__(
+        self,
+        stream: Union[str, BinaryIO],
+        recent: Optional[Dict[str, _DocEntry]] = None,
+    ):
         if not hasattr(self, "_root"):
+            # Only a RootedLoader may load a string, which has no name
+            assert not isinstance(stream, str)
             self._root = Path(stream.name).parent
-        self._cache = dict()
+        self._deps = []
+        self._recent = {} if recent is None else recent
         super().__init__(stream)
 
     @staticmethod
@@ -77,6 +147,48 @@ class Loader(yaml.SafeLoader):
         RootedLoader._root = root
         return RootedLoader
 
+    @classmethod
+    def load_document(
+        cls, path: Path, recent: Optional[Dict[str, _DocEntry]] = None
+    ) -> _DocEntry:
+        """Load a YAML document from a file, using the shared cache if possible
+
+        A cached document is only reused if neither it nor any document it
+        references has changed on disk. Documents modified too recently for
+        that to be detected are only reused within the current load.
+        """
+        if recent is None:
+            recent = {}
+
+        key = _doc_key(path)
+        entry = recent.get(key[0]) or cls._cache.get(key[0])
+        if entry is not None and entry[0][0] == key:
+            if all(_doc_key(Path(dep[0])) == dep for dep in entry[0][1:]):
+                if key[0] in cls._cache:
+                    cls._cache.move_to_end(key[0])
+                return entry
+
+        with path.open("rb") as f:
+            # Always use the base Loader, so the document's own !from_yaml
+            # references are relative to that document.
+            loader = Loader(f, recent)
+            try:
+                doc = loader.get_single_data()
+            finally:
+                loader.dispose()
+
+        # A document may reference the same file many times; validate it once
+        deps = tuple(dict.fromkeys((key, *loader._deps)))
+        entry = (deps, doc)
+        if any(_doc_is_racy(dep) for dep in deps):
+            cls._cache.pop(key[0], None)
+            recent[key[0]] = entry
+        else:
+            cls._cache[key[0]] = entry
+            if len(cls._cache) > cls._CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return entry
+
     def from_yaml(self, node: yaml.nodes.Node) -> Any:
         """
         Implementes a !from_yaml constructor with the following syntax:
@@ -100,7 +212,7 @@ class Loader(yaml.SafeLoader):
         assert isinstance(content, str)
 
         # Split on unquoted spaces
-        parts = shlex.split(content)
+        parts = _split_args(content)
         if len(parts) != 2:
             raise yaml.YAMLError("Two arguments expected to !from_yaml")
         filename, key = parts
@@ -109,23 +221,25 @@ class Loader(yaml.SafeLoader):
         path = self._root / filename
 
         # Load the other YAML document
-        doc = self._cache.get(path)
-        if not doc:
-            with path.open("r") as f:
-                doc = yaml.load(f, self.__class__)
-                self._cache[path] = doc
+        deps, doc = self.load_document(path, self._recent)
+        self._deps.extend(deps)
 
         # Retrieve the key
+        if "\\" in key:
+            # Be sure to replace any escaped '.' characters with *just* the '.'
+            keys = [k.replace("\\.", ".") for k in _KEY_SEP_PATTERN.split(key)]
+        else:
+            keys = key.split(".")
+
         try:
             cur = doc
-            # Use a negative look-behind to split the key on non-escaped '.' characters
-            for k in re.split(r"(?<!\\)\.", key):
-                cur = cur[
-                    k.replace("\\.", ".")
-                ]  # Be sure to replace any escaped '.' characters with *just* the '.'
+            for k in keys:
+                cur = cur[k]
         except KeyError:
             raise yaml.YAMLError(f"Key {key!r} not found in {filename}")
-        return cur
+
+        # The document is shared via the cache; don't let callers modify it
+        return copy.deepcopy(cur)
 
     def override(self, node: yaml.nodes.Node) -> OverrideMixin:
         """
@@ -136,8 +250,26 @@ class Loader(yaml.SafeLoader):
         content = self.construct_scalar(node)
         assert isinstance(content, str)
 
+        if not content:
+            obj = None
+        elif _YAML_SYNTAX_PATTERN.search(content):
+            # Share this load's state, so documents referenced by the content
+            # are tracked as dependencies of the document being loaded.
+            loader = self._rooted_loader(root=self._root)(content, self._recent)
+            try:
+                obj = loader.get_single_data()
+            finally:
+                loader.dispose()
+            self._deps.extend(loader._deps)
+        else:
+            # The content is a lone plain scalar (the common case): resolve its
+            # type and construct it directly rather than starting a new parser.
+            tag = self.resolve(  # type: ignore[no-untyped-call]
+                yaml.nodes.ScalarNode, content, (True, False)
+            )
+            obj = self.construct_object(yaml.nodes.ScalarNode(tag, content))
+
         # Dynamically add an OverrideMixin to the resulting object's type
-        obj = yaml.load(content, self._rooted_loader(root=self._root))
         if obj is None:
             obj = OverrideNone()
         else:
@@ -170,27 +302,39 @@ def find_config() -> Tuple[Path, Path, ScubaConfig]:
         config  The loaded configuration
     """
     cross_fs = "SCUBA_DISCOVERY_ACROSS_FILESYSTEM" in os.environ
-    path = Path.cwd()
+    cwd = Path.cwd()
+    path = cwd
+    dev = os.stat(path).st_dev
 
     while True:
         cfg_path = path / SCUBA_YML
         if cfg_path.exists():
-            return path, Path.cwd().relative_to(path), load_config(cfg_path, path)
-
-        if not cross_fs and path.is_mount():
-            raise ConfigNotFoundError(
-                f"{SCUBA_YML} not found here or any parent up to mount point {path}"
-                "\nStopping at filesystem boundary"
-                " (SCUBA_DISCOVERY_ACROSS_FILESYSTEM not set)."
-            )
-
-        # Traverse up directory hierarchy
-        path, rest = path.parent, path.name
-        if not rest:
+            return path, cwd.relative_to(path), load_config(cfg_path, path)
+
+        # Traverse up directory hierarchy, unless path is a mount point. This
+        # is what Path.is_mount() checks, without re-stat'ing path each time.
+        parent = path.parent
+        if parent == path:
+            if not cross_fs:
+                _raise_mount_point(path)
             raise ConfigNotFoundError(
                 f"{SCUBA_YML} not found here or any parent directories"
             )
 
+        parent_dev = os.stat(parent).st_dev
+        if not cross_fs and parent_dev != dev:
+            _raise_mount_point(path)
+
+        path, dev = parent, parent_dev
+
+
+def _raise_mount_point(path: Path) -> NoReturn:
+    raise ConfigNotFoundError(
+        f"{SCUBA_YML} not found here or any parent up to mount point {path}"
+        "\nStopping at filesystem boundary"
+        " (SCUBA_DISCOVERY_ACROSS_FILESYSTEM not set)."
+    )
+
 
 def _expand_env_vars(in_str: str) -> str:
     """Wraps utils.expand_env_vars() to convert errors
@@ -258,14 +402,14 @@ def _process_environment(node: CfgNode, name: str) -> Environment:
     if not node:
         pass
     elif isinstance(node, dict):
-        for k, v in node.items():
-            if v is None:
-                v = os.getenv(k, "")
-            result[k] = str(v)
+        # A null value takes the value from the current environment
+        getenv = os.environ.get
+        result = {
+            k: getenv(k, "") if v is None else v if type(v) is str else str(v)
+            for k, v in node.items()
+        }
     elif isinstance(node, list):
-        for e in node:
-            k, v = utils.parse_env_var(e)
-            result[k] = v
+        result = dict(map(utils.parse_env_var, node))
     else:
         raise ConfigError(
             f"'{name}' must be list or mapping, not {type(node).__name__}"
@@ -275,24 +419,23 @@ def _process_environment(node: CfgNode, name: str) -> Environment:
 
 
 def _get_nullable_str(data: Dict[str, Any], key: str) -> Optional[str]:
-    # N.B. We can't use data.get() here, because that might return
-    # None, leading to ambiguity between the key being absent or set
-    # to a null value.
+    # N.B. We can't use data.get() with the default of None here, because
+    # that would lead to ambiguity between the key being absent or set to
+    # a null value.
     #
     # "Note that a null is different from an empty string and that a
     # mapping entry with some key and a null value is valid and
     # different from not having that key in the mapping."
     #   - http://yaml.org/type/null.html
-    if not key in data:
+    value = data.get(key, _MISSING)
+    if value is _MISSING:
         return None
 
-    value = data[key]
-
     # We represent a null value as an empty string.
+    if value is None:
+        return ""
     if isinstance(value, OverrideNone):
-        value = OverrideStr("")
-    elif value is None:
-        value = ""
+        return OverrideStr("")
 
     if not isinstance(value, str):
         raise ConfigError(f"{key!r} must be a string, not {type(value).__name__}")
@@ -507,6 +650,18 @@ class ScubaAlias:
     docker_args: Optional[List[str]] = None
     volumes: Optional[Dict[Path, ScubaVolume]] = None
 
+    # For a single-line script, the command to which user arguments are
+    # appended (including the separating space); otherwise None.
+    single_line_prefix: Optional[str] = dataclasses.field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        prefix = None
+        if len(self.script) == 1 and isinstance(self.script[0], str):
+            prefix = self.script[0] + " "
+        object.__setattr__(self, "single_line_prefix", prefix)
+
     @classmethod
     def from_dict(
         cls, name: str, node: CfgNode, scuba_root: Optional[Path]
@@ -531,6 +686,21 @@ class ScubaAlias:
         return cls(name=name, script=script)
 
 
+# Top-level nodes, all of which are optional
+_CONFIG_NODES = frozenset(
+    (
+        "image",
+        "aliases",
+        "hooks",
+        "entrypoint",
+        "environment",
+        "shell",
+        "docker_args",
+        "volumes",
+    )
+)
+
+
 class ScubaConfig:
     shell: str
     entrypoint: Optional[str]
@@ -548,20 +718,14 @@ class ScubaConfig:
         if data is None:
             data = {}
 
-        optional_nodes = (
-            "image",
-            "aliases",
-            "hooks",
-            "entrypoint",
-            "environment",
-            "shell",
-            "docker_args",
-            "volumes",
-        )
+        if not isinstance(data, dict):
+            raise ConfigError(
+                f"{SCUBA_YML}: must be a mapping, not {type(data).__name__}"
+            )
 
         # Check for unrecognized nodes
-        extra = [n for n in data if not n in optional_nodes]
-        if extra:
+        if not data.keys() <= _CONFIG_NODES:
+            extra = [n for n in data if n not in _CONFIG_NODES]
             raise ConfigError(
                 f"{SCUBA_YML}: Unrecognized node{'s' if len(extra) > 1 else ''}:"
                 + ", ".join(extra)
@@ -587,12 +751,16 @@ class ScubaConfig:
         return aliases
 
     def _load_hooks(self, data: CfgData) -> Dict[str, List[str]]:
-        hooks = {}
+        hooks: Dict[str, List[str]] = {}
+        hooks_node = data.get("hooks")
+        if not hooks_node:
+            return hooks
+
         for name in (
             "user",
             "root",
         ):
-            node = data.get("hooks", {}).get(name)
+            node = hooks_node.get(name)
             if node:
                 hooks[name] = _process_script_node(node, name)
         return hooks
@@ -606,11 +774,11 @@ class ScubaConfig:
 
 def load_config(path: Path, scuba_root: Path) -> ScubaConfig:
     try:
-        with path.open("r") as f:
-            data = yaml.load(f, Loader)
+        _, data = Loader.load_document(path)
     except IOError as e:
         raise ConfigError(f"Error opening {SCUBA_YML}: {e}")
     except yaml.YAMLError as e:
         raise ConfigError(f"Error loading {SCUBA_YML}: {e}")
 
-    return ScubaConfig(data, scuba_root)
+    # The document may be shared with later loads, via the cache
+    return ScubaConfig(copy.deepcopy(data), scuba_root)
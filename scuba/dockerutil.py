@@ -1,9 +1,15 @@
 from __future__ import annotations
+import functools
 import subprocess
-import json
-from typing import Any, Dict, IO, Optional, Sequence, Union
+from typing import Any, Dict, IO, NamedTuple, Optional, Sequence, Tuple, Union
 from pathlib import Path
 
+try:
+    # Use the faster orjson parser, if available
+    from orjson import loads as _json_loads  # type: ignore[import]
+except ImportError:
+    from json import loads as _json_loads  # type: ignore[assignment]
+
 # https://github.com/python/typeshed/blob/main/stdlib/subprocess.pyi
 _CMD = Union[str, bytes, Sequence[Union[str, bytes]]]
 _FILE = Union[None, int, IO[Any]]
@@ -38,10 +44,15 @@ def call(
         raise DockerExecuteError() from err
 
 
-def _run_docker(*args: str, capture: bool = False) -> subprocess.CompletedProcess[str]:
-    """Run docker and raise DockerExecuteError on ENOENT"""
+def _run_docker(
+    *args: str, capture: bool = False
+) -> subprocess.CompletedProcess[bytes]:
+    """Run docker and raise DockerExecuteError on ENOENT
+
+    Captured output is left as bytes, for the caller to decode if needed.
+    """
     docker_args = ["docker"] + list(args)
-    kw: Dict[str, Any] = dict(text=True)
+    kw: Dict[str, Any] = {}
     if capture:
         kw.update(capture_output=True)
 
@@ -51,19 +62,27 @@ def _run_docker(*args: str, capture: bool = False) -> subprocess.CompletedProces
         raise DockerExecuteError() from err
 
 
-def docker_inspect(image: str) -> dict:
-    """Inspects a docker image
+def _inspect_image(image: str, *args: str) -> bytes:
+    """Inspects a docker image, with additional docker inspect arguments
 
-    Returns: Parsed JSON data
+    Returns: The output of docker inspect
     """
-    cp = _run_docker("inspect", "--type", "image", image, capture=True)
+    cp = _run_docker("inspect", "--type", "image", *args, image, capture=True)
 
     if not cp.returncode == 0:
-        if "no such image" in cp.stderr.lower():
+        if b"no such image" in cp.stderr.lower():
             raise NoSuchImageError(image)
-        raise DockerError(f"Failed to inspect image: {cp.stderr.strip()}")
+        raise DockerError(f"Failed to inspect image: {cp.stderr.decode().strip()}")
+
+    return cp.stdout
+
 
-    result = json.loads(cp.stdout)[0]
+def docker_inspect(image: str) -> dict:
+    """Inspects a docker image
+
+    Returns: Parsed JSON data
+    """
+    result = _json_loads(_inspect_image(image))[0]
     assert isinstance(result, dict)
     return result
 
@@ -86,49 +105,79 @@ def docker_inspect_or_pull(image: str) -> dict:
         return docker_inspect(image)
 
 
+# This format ouputs the same thing as '__docker_images --repo --tag'
+_IMAGES_FORMAT = (
+    # Always show the bare repository name
+    r"{{.Repository}}"
+    # And if there is a tag, show that too
+    r'{{if ne .Tag "<none>"}}\n{{.Repository}}:{{.Tag}}{{end}}'
+)
+
+
 def get_images() -> Sequence[str]:
     """Get the current list of docker images
 
     Returns: List of image names
     """
-    cp = _run_docker(
-        "images",
-        # This format ouputs the same thing as '__docker_images --repo --tag'
-        "--format",
-        (
-            # Always show the bare repository name
-            r"{{.Repository}}"
-            # And if there is a tag, show that too
-            r'{{if ne .Tag "<none>"}}\n{{.Repository}}:{{.Tag}}{{end}}'
-        ),
-        capture=True,
-    )
+    cp = _run_docker("images", "--format", _IMAGES_FORMAT, capture=True)
 
     if not cp.returncode == 0:
-        raise DockerError(f"Failed to retrieve images: {cp.stderr.strip()}")
+        raise DockerError(f"Failed to retrieve images: {cp.stderr.decode().strip()}")
+
+    # Image names never contain whitespace, so this also drops empty lines
+    return cp.stdout.decode().split()
+
+
+# The parts of the image config used by scuba, as JSON separated by a
+# unit separator. This avoids transferring and parsing the full inspect data.
+_IMAGE_CONFIG_FORMAT = "{{json .Config.Cmd}}\x1f{{json .Config.Entrypoint}}"
+
+
+class ImageConfig(NamedTuple):
+    """The parts of a docker image's config used by scuba
+
+    Instances are cached and shared, so the fields are immutable tuples.
+    """
 
-    return cp.stdout.splitlines()
+    cmd: Optional[Tuple[str, ...]]
+    entrypoint: Optional[Tuple[str, ...]]
 
 
-def _get_image_config(image: str, key: str) -> Optional[Sequence[str]]:
-    info = docker_inspect_or_pull(image)
+@functools.lru_cache(maxsize=32)
+def _inspect_image_config(image: str) -> ImageConfig:
+    """Inspects the command and entrypoint of a docker image"""
+    output = _inspect_image(image, "--format", _IMAGE_CONFIG_FORMAT)
     try:
-        result = info["Config"][key]
-    except KeyError as ke:
-        raise DockerError(f"Failed to inspect image: JSON result missing key {ke}")
+        cmd, entrypoint = map(_json_loads, output.split(b"\x1f"))
+    except ValueError:
+        raise DockerError(f"Failed to inspect image: unexpected output {output!r}")
+
+    assert isinstance(cmd, (type(None), list))
+    assert isinstance(entrypoint, (type(None), list))
+    return ImageConfig(
+        cmd=tuple(cmd) if cmd is not None else None,
+        entrypoint=tuple(entrypoint) if entrypoint is not None else None,
+    )
 
-    assert isinstance(result, (type(None), list))
-    return result
+
+def get_image_config(image: str) -> ImageConfig:
+    """Gets the command and entrypoint of an image, pulling it if it doesn't exist"""
+    try:
+        return _inspect_image_config(image)
+    except NoSuchImageError:
+        # If it doesn't exist yet, try to pull it now (#79)
+        docker_pull(image)
+        return _inspect_image_config(image)
 
 
 def get_image_command(image: str) -> Optional[Sequence[str]]:
     """Gets the default command for an image"""
-    return _get_image_config(image, "Cmd")
+    return get_image_config(image).cmd
 
 
 def get_image_entrypoint(image: str) -> Optional[Sequence[str]]:
     """Gets the image entrypoint"""
-    return _get_image_config(image, "Entrypoint")
+    return get_image_config(image).entrypoint
 
 
 def make_vol_opt(
@@ -147,8 +196,7 @@ def make_vol_opt(
     if not contdir.is_absolute():
         raise ValueError(f"contdir not absolute: {contdir}")
 
-    vol = f"--volume={hostdir_or_volname}:{contdir}"
     if options:
         assert not isinstance(options, str)
-        vol += ":" + ",".join(options)
-    return vol
+        return f"--volume={hostdir_or_volname}:{contdir}:{','.join(options)}"
+    return f"--volume={hostdir_or_volname}:{contdir}"
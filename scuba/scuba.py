@@ -1,31 +1,67 @@
 from __future__ import annotations
-import copy
 import dataclasses
+import functools
+import itertools
 import os
-import pprint
 import shutil
 import sys
 import tempfile
 from grp import getgrgid
 from pathlib import Path
 from pwd import getpwuid
-from typing import cast, Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
-from typing import TextIO
+from typing import cast, Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+from typing import TextIO, Tuple, Union
 
 from .config import ScubaConfig, OverrideMixin
 from .config import ConfigError, ScubaVolume
-from .dockerutil import get_image_command
-from .dockerutil import get_image_entrypoint
+from .dockerutil import get_image_config
 from .dockerutil import make_vol_opt
-from .utils import shell_quote_cmd, flatten_list, get_umask, writeln
+from .utils import shell_quote_cmd, flatten_list, get_umask
 
-VolumeTuple = Tuple[Path, Path, List[str]]
+
+class VolumeTuple(NamedTuple):
+    """A volume (bind-mount) passed to docker run"""
+
+    hostpath: Path
+    contpath: Path
+    options: Tuple[str, ...]
+
+
+# User and group database lookups may go over the network (e.g. LDAP, SSSD),
+# and don't change during a run.
+@functools.lru_cache(maxsize=None)
+def _get_user_name(uid: int) -> str:
+    return getpwuid(uid).pw_name
+
+
+@functools.lru_cache(maxsize=None)
+def _get_group_name(gid: int) -> str:
+    return getgrgid(gid).gr_name
 
 
 class ScubaError(Exception):
     pass
 
 
+# The scubainit binary is installed alongside this package
+_SCUBAINIT_PATH = os.path.join(os.path.dirname(__file__), "scubainit")
+
+
+@functools.lru_cache(maxsize=None)
+def _locate_scubainit() -> str:
+    """Determine path to scubainit binary"""
+    if not os.path.isfile(_SCUBAINIT_PATH):
+        raise ScubaError(f"scubainit not found at {_SCUBAINIT_PATH!r}")
+    return _SCUBAINIT_PATH
+
+
+# Hook name -> environment variable telling scubainit where its script is
+_HOOK_ENV = {
+    "root": "SCUBAINIT_HOOK_ROOT",
+    "user": "SCUBAINIT_HOOK_USER",
+}
+
+
 class ScubaDive:
     context: ScubaContext
     env_vars: Dict[str, str]
@@ -55,6 +91,18 @@ class ScubaDive:
         self.entrypoint_override = entrypoint
         self.keep_tempfiles = keep_tempfiles
 
+        if "DOCKER_HOST" in os.environ:
+            """
+            Docker is running remotely (e.g. boot2docker on OSX).
+            We don't need to do any user setup whatsoever.
+
+            TODO: For now, remote instances won't have any .scubainit
+
+            See:
+            https://github.com/JonathonReinhart/scuba/issues/17
+            """
+            raise ScubaError("Remote docker not supported (DOCKER_HOST is set)")
+
         # These will be added to docker run cmdline
         self.env_vars = env or {}
         self.volumes = []
@@ -88,18 +136,6 @@ class ScubaDive:
 
             self.__make_scubadir()
 
-            if self.is_remote_docker:
-                """
-                Docker is running remotely (e.g. boot2docker on OSX).
-                We don't need to do any user setup whatsoever.
-
-                TODO: For now, remote instances won't have any .scubainit
-
-                See:
-                https://github.com/JonathonReinhart/scuba/issues/17
-                """
-                raise ScubaError("Remote docker not supported (DOCKER_HOST is set)")
-
             # Docker is running natively
             self.__setup_native_run()
         except:
@@ -117,6 +153,9 @@ class ScubaDive:
             shutil.rmtree(self.__scubadir_hostpath)
 
     def __str__(self) -> str:
+        # Only needed for verbose output, so not imported up front
+        import pprint
+
         data = dict(
             verbose=self.verbose,
             as_root=self.as_root,
@@ -125,7 +164,11 @@ class ScubaDive:
             docker_args=self.docker_args,
             env_vars=self.env_vars,
             volumes=[f"{hp} => {cp} {opt}" for hp, cp, opt in self.__get_vol_opts()],
-            context=dataclasses.asdict(self.context),
+            # A shallow copy is enough for display; asdict() would deep-copy
+            context={
+                f.name: getattr(self.context, f.name)
+                for f in dataclasses.fields(self.context)
+            },
         )
         # TODO(#242) Use sort_dicts=False in Python >= 3.8
         return "ScubaDive\n" + pprint.pformat(data, width=100)
@@ -140,18 +183,26 @@ class ScubaDive:
             raise KeyError(name)
         self.env_vars[name] = str(val)
 
+    def add_envs(self, env: Dict[str, str]) -> None:
+        """Add several environment variables to the docker run invocation"""
+        if not self.env_vars.keys().isdisjoint(env):
+            raise KeyError(*(name for name in env if name in self.env_vars))
+        self.env_vars.update(env)
+
     def add_volume(
         self,
         hostpath: Union[Path, str],
         contpath: Union[Path, str],
-        options: Optional[List[str]] = None,
+        options: Optional[Sequence[str]] = None,
     ) -> None:
         """Add a volume (bind-mount) to the docker run invocation"""
-        hostpath = Path(hostpath)
-        contpath = Path(contpath)
-        if options is None:
-            options = []
-        self.volumes.append((hostpath, contpath, options))
+        if not isinstance(hostpath, Path):
+            hostpath = Path(hostpath)
+        if not isinstance(contpath, Path):
+            contpath = Path(contpath)
+        self.volumes.append(
+            VolumeTuple(hostpath, contpath, tuple(options) if options else ())
+        )
 
     def try_create_volumes(self) -> None:
         """Try to create non-existent host paths prior to docker run invocation
@@ -160,10 +211,6 @@ class ScubaDive:
         and the initial working directory either exist or are created as root by
         Docker.
         """
-        # Cannot create local directories for a remote host
-        if self.is_remote_docker:
-            return
-
         for vol in self.context.volumes.values():
             if vol.host_path is None or vol.host_path.exists():
                 continue
@@ -184,15 +231,6 @@ class ScubaDive:
     def set_workdir(self, workdir: Path) -> None:
         self.workdir = workdir
 
-    def __locate_scubainit(self) -> str:
-        """Determine path to scubainit binary"""
-        pkg_path = os.path.dirname(__file__)
-
-        scubainit_path = os.path.join(pkg_path, "scubainit")
-        if not os.path.isfile(scubainit_path):
-            raise ScubaError(f"scubainit not found at {scubainit_path!r}")
-        return scubainit_path
-
     def __make_scubadir(self) -> None:
         """Make temp directory where all ancillary files are bind-mounted"""
         self.__scubadir_hostpath = tempfile.mkdtemp(prefix="scubadir")
@@ -203,35 +241,32 @@ class ScubaDive:
         # These options are appended to mounted volume arguments
         # NOTE: This tells Docker to re-label the directory for compatibility
         # with SELinux. See `man docker-run` for more information.
-        self.vol_opts = ["z"]
+        self.vol_opts = ("z",)
 
         # Pass variables to scubainit
-        self.add_env("SCUBAINIT_UMASK", f"{get_umask():04o}")
+        scubainit_env = {"SCUBAINIT_UMASK": f"{get_umask():04o}"}
 
         # Check if the CLI args specify "run as root", or if the command (alias) does
         if not self.as_root and not self.context.as_root:
             uid = os.getuid()
             gid = os.getgid()
-            self.add_env("SCUBAINIT_UID", uid)
-            self.add_env("SCUBAINIT_GID", gid)
-            self.add_env("SCUBAINIT_USER", getpwuid(uid).pw_name)
-            self.add_env("SCUBAINIT_GROUP", getgrgid(gid).gr_name)
+            scubainit_env["SCUBAINIT_UID"] = str(uid)
+            scubainit_env["SCUBAINIT_GID"] = str(gid)
+            scubainit_env["SCUBAINIT_USER"] = _get_user_name(uid)
+            scubainit_env["SCUBAINIT_GROUP"] = _get_group_name(gid)
 
         if self.verbose:
-            self.add_env("SCUBAINIT_VERBOSE", 1)
+            scubainit_env["SCUBAINIT_VERBOSE"] = "1"
+
+        self.add_envs(scubainit_env)
 
         # Copy scubainit into the container
         # We make a copy because Docker 1.13 gets pissed if we try to re-label
         # /usr, and Fedora 28 gives an AVC denial.
-        scubainit_cpath = self.copy_scubadir_file(
-            "scubainit", self.__locate_scubainit()
-        )
+        scubainit_cpath = self.copy_scubadir_file("scubainit", _locate_scubainit())
 
         # Hooks
-        for name in (
-            "root",
-            "user",
-        ):
+        for name in _HOOK_ENV:
             self.__generate_hook_script(name, self.context.shell)
 
         # allocate TTY if scuba's output is going to a terminal
@@ -246,7 +281,7 @@ class ScubaDive:
         """
         if not self.context.script:
             # No user-provided command; we want to run the image's default command
-            default_cmd = get_image_command(self.context.image)
+            default_cmd = get_image_config(self.context.image).cmd
             if not default_cmd:
                 raise ScubaError("No command given and no image-specified command")
             self.context.script = [shell_quote_cmd(default_cmd)]
@@ -265,17 +300,15 @@ class ScubaDive:
             if self.context.entrypoint != "":
                 self.docker_cmd = [self.context.entrypoint]
         else:
-            ep = get_image_entrypoint(self.context.image)
+            ep = get_image_config(self.context.image).entrypoint
             if ep:
                 self.docker_cmd = list(ep)
 
         # The user command is executed via a generated shell script
         with self.open_scubadir_file("command.sh") as cmd_script:
             self.docker_cmd += [self.context.shell, cmd_script.container_path]
-            writeln(cmd_script, "# Auto-generated from scuba")
-            writeln(cmd_script, "set -e")
-            for cmd in self.context.script:
-                writeln(cmd_script, cmd)
+            lines = ["# Auto-generated from scuba", "set -e", *self.context.script]
+            cmd_script.write("\n".join(lines) + "\n")
 
     def open_scubadir_file(self, name: str) -> Any:
         """Opens a text file in the 'scubadir' for writing
@@ -287,14 +320,17 @@ class ScubaDive:
         assert self.__scubadir_contpath is not None
 
         path = os.path.join(self.__scubadir_hostpath, name)
-        assert not os.path.exists(path)
 
-        # Make any directories required
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Make any directories required (the scubadir itself already exists)
+        dirname = os.path.dirname(path)
+        if dirname != self.__scubadir_hostpath:
+            os.makedirs(dirname, exist_ok=True)
 
+        # The file must not already exist; exclusive creation checks that
+        # without a separate stat.
         # TODO: How to represent TextIO plus container_path attribute?
         # Deriving from TextIO seemed to do nothing.
-        f: Any = open(path, "w")
+        f: Any = open(path, "x")
         f.container_path = os.path.join(self.__scubadir_contpath, name)
 
         return f
@@ -309,7 +345,7 @@ class ScubaDive:
 
         dest = os.path.join(self.__scubadir_hostpath, name)
         assert not os.path.exists(dest)
-        shutil.copy2(source, dest)
+        shutil.copy(source, dest)
 
         return os.path.join(self.__scubadir_contpath, name)
 
@@ -320,17 +356,21 @@ class ScubaDive:
 
         # Generate the hook script, mount it into the container, and tell scubainit
         with self.open_scubadir_file(f"hooks/{name}.sh") as f:
-            self.add_env(f"SCUBAINIT_HOOK_{name.upper()}", f.container_path)
+            self.add_env(_HOOK_ENV[name], f.container_path)
 
-            writeln(f, f"#!{shell}")
-            writeln(f, "# Auto-generated from .scuba.yml")
-            writeln(f, "set -e")
-            for cmd in script:
-                writeln(f, cmd)
+            lines = [
+                f"#!{shell}",
+                "# Auto-generated from .scuba.yml",
+                "set -e",
+                *script,
+            ]
+            f.write("\n".join(lines) + "\n")
 
     def __get_vol_opts(self) -> Iterable[VolumeTuple]:
+        vol_opts = self.vol_opts
         for hostpath, contpath, options in self.volumes:
-            yield hostpath, contpath, options + self.vol_opts
+            # Concatenating onto an empty tuple (the common case) doesn't copy
+            yield VolumeTuple(hostpath, contpath, options + vol_opts)
 
     def get_docker_cmdline(self) -> Sequence[str]:
         args = [
@@ -342,33 +382,31 @@ class ScubaDive:
             "--rm",
         ]
 
-        for name, val in self.env_vars.items():
-            args.append(f"--env={name}={val}")
+        args.extend(f"--env={name}={val}" for name, val in self.env_vars.items())
 
-        for hostpath, contpath, options in self.__get_vol_opts():
-            args.append(make_vol_opt(hostpath, contpath, options))
+        args.extend(
+            make_vol_opt(hostpath, contpath, options)
+            for hostpath, contpath, options in self.__get_vol_opts()
+        )
 
-        for _, vol in self.context.volumes.items():
-            args.append(vol.get_vol_opt())
+        args.extend(vol.get_vol_opt() for vol in self.context.volumes.values())
 
         if self.workdir:
             args += ["-w", str(self.workdir)]
 
-        args += self.options
-
-        # .scuba.yml (top-level or alias)
-        if self.context.docker_args is not None:
-            args += self.context.docker_args
-
-        # Command-line -d
-        if self.docker_args:
-            args += self.docker_args
-
-        # Docker image
-        args.append(self.context.image)
-
-        # Command to run in container
-        args += self.docker_cmd
+        args.extend(
+            itertools.chain(
+                self.options,
+                # .scuba.yml (top-level or alias)
+                self.context.docker_args or (),
+                # Command-line -d
+                self.docker_args,
+                # Docker image
+                (self.context.image,),
+                # Command to run in container
+                self.docker_cmd,
+            )
+        )
 
         return args
 
@@ -407,9 +445,9 @@ class ScubaContext:
         shell = None
         script = None
         entrypoint = cfg.entrypoint
-        environment = copy.copy(cfg.environment)
-        docker_args = copy.copy(cfg.docker_args) or []
-        volumes: Dict[Path, ScubaVolume] = copy.copy(cfg.volumes or {})
+        environment = cfg.environment  # Shared unless modified by an alias
+        docker_args = list(cfg.docker_args or ())
+        volumes: Dict[Path, ScubaVolume] = dict(cfg.volumes or {})
         as_root = False
 
         if command:
@@ -429,19 +467,20 @@ class ScubaContext:
                 if alias.as_root:
                     as_root = True
 
-                if isinstance(alias.docker_args, OverrideMixin) or docker_args is None:
-                    docker_args = cast(List[str], alias.docker_args)
-                elif alias.docker_args is not None:
-                    docker_args.extend(alias.docker_args)
+                alias_docker_args = alias.docker_args
+                if isinstance(alias_docker_args, OverrideMixin):
+                    docker_args = cast(List[str], alias_docker_args)
+                elif alias_docker_args is not None:
+                    docker_args.extend(alias_docker_args)
 
                 if alias.volumes is not None:
                     volumes.update(alias.volumes)
 
                 # Merge/override the environment
                 if alias.environment:
-                    environment.update(alias.environment)
+                    environment = {**environment, **alias.environment}
 
-                if len(alias.script) > 1:
+                if alias.single_line_prefix is None:
                     # Alias is a multiline script; no additional
                     # arguments are allowed in the scuba invocation.
                     if len(command) > 1:
@@ -449,13 +488,13 @@ class ScubaContext:
                             "Additional arguments not allowed with multi-line aliases"
                         )
                     script = alias.script
+                    if not all(isinstance(s, str) for s in script):
+                        script = flatten_list(script)
 
                 else:
                     # Alias is a single-line script; perform substituion
                     # and add user arguments.
-                    script = [alias.script[0] + " " + shell_quote_cmd(command[1:])]
-
-            script = flatten_list(script)
+                    script = [alias.single_line_prefix + shell_quote_cmd(command[1:])]
 
         # If a shell was given on the CLI, it should override the shell set by
         # the alias or top-level config
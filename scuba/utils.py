@@ -1,7 +1,14 @@
+import functools
 import os
-from shlex import quote as shell_quote
+import shlex
 import string
-from typing import Iterable, TextIO, Tuple
+from typing import Iterable, List, TextIO, Tuple
+
+
+@functools.lru_cache(maxsize=1024)
+def shell_quote(s: str) -> str:
+    """shlex.quote(), cached since the same arguments are quoted repeatedly"""
+    return shlex.quote(s)
 
 
 def shell_quote_cmd(cmdlist: Iterable[str]) -> str:
@@ -19,22 +26,23 @@ def format_cmdline(args: Iterable[str], maxwidth: int = 80) -> str:
     maxwidth -= 2
 
     def lines() -> Iterable[str]:
-        line = ""
-        for a in (shell_quote(a) for a in args):
-            # If adding this argument will make the line too long,
-            # yield the current line, and start a new one.
-            if len(line) + len(a) + 1 > maxwidth:
-                yield line
-                line = ""
-
-            # Append this argument to the current line, separating
-            # it by a space from the existing arguments.
+        line: List[str] = []
+        length = 0
+        for a in map(shell_quote, args):
+            # If adding this argument (and the space separating it from the
+            # existing arguments) will make the line too long, yield the
+            # current line, and start a new one.
+            if line and length + 1 + len(a) > maxwidth:
+                yield " ".join(line)
+                line = []
+                length = 0
+
             if line:
-                line += " " + a
-            else:
-                line = a
+                length += 1
+            line.append(a)
+            length += len(a)
 
-        yield line
+        yield " ".join(line)
 
     return " \\\n".join(lines())
 
@@ -49,12 +57,10 @@ def parse_env_var(s: str) -> Tuple[str, str]:
     then the current value of the named variable is propagated into the
     container's environment
     """
-    parts = s.split("=", 1)
-    if len(parts) == 2:
-        k, v = parts
+    k, sep, v = s.partition("=")
+    if sep:
         return (k, v)
 
-    k = parts[0]
     return (k, os.getenv(k, ""))
 
 
@@ -62,12 +68,15 @@ def flatten_list(x: list) -> list:
     if not isinstance(x, list):
         raise ValueError("argument is not a list")
     result = []
-    for i in x:
-        if isinstance(i, list):
-            for j in flatten_list(i):
-                result.append(j)
-        else:
+    stack = [iter(x)]
+    while stack:
+        for i in stack[-1]:
+            if isinstance(i, list):
+                stack.append(iter(i))
+                break
             result.append(i)
+        else:
+            stack.pop()
     return result
 
 
@@ -87,4 +96,7 @@ def expand_env_vars(in_str: str) -> str:
 
     Can raise `KeyError` if a variable is referenced but not defined, similar to
     bash's nounset (set -u) option"""
+    if "$" not in in_str:
+        # Nothing to substitute
+        return in_str
     return string.Template(in_str).substitute(os.environ)
@@ -28,8 +28,7 @@ class GitDescribe:
 
 def git_describe() -> GitDescribe:
     # Get the version from the local Git repository
-    subprocess.run(["git", "update-index", "-q", "--refresh"], check=True, cwd=PROJPATH)
-
+    # (--dirty refreshes the index itself, so no `git update-index` is needed)
     result = subprocess.run(
         ["git", "describe", "--long", "--dirty", "--tag"],
         check=True,
@@ -46,6 +45,15 @@ def git_describe() -> GitDescribe:
 
 
 def get_version() -> str:
+    # Built package
+    # The build bakes the version into _version.py (see setup.py)
+    try:
+        from ._version import version  # type: ignore
+    except ImportError:
+        pass
+    else:
+        return str(version)
+
     # Git repo
     # If a local git repository is present, use `git describe` to provide a rich version
     gitdir = normpath(join(PROJPATH, ".git"))
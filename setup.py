@@ -1,6 +1,7 @@
 import scuba.version
 from setuptools import setup, Command
 from distutils.command.build import build
+from setuptools.command.build_py import build_py
 from setuptools.command.develop import develop
 from subprocess import check_call
 import os
@@ -36,6 +37,22 @@ class develop(develop):
         super().run()
 
 
+class build_py(build_py):
+    def run(self):
+        super().run()
+
+        # Editable installs keep determining their version from Git
+        if not getattr(self, "editable_mode", False):
+            self.write_version_file()
+
+    def write_version_file(self):
+        # Bake the version into the built package, so that it needn't be
+        # determined (e.g. via `git describe`) every time scuba runs
+        path = os.path.join(self.build_lib, "scuba", "_version.py")
+        with open(path, "w") as f:
+            f.write(f"version = {self.distribution.get_version()!r}\n")
+
+
 ################################################################################
 # Dynamic versioning
 
@@ -76,6 +93,7 @@ setup(
     cmdclass={
         "build_scubainit": build_scubainit,
         "build": build_hook,
+        "build_py": build_py,
         "develop": develop,
     },
 )
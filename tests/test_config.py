@@ -2,7 +2,8 @@ import logging
 import os
 from pathlib import Path
 import pytest
-from typing import Optional
+import shlex
+from typing import Any, Optional
 from unittest import mock
 
 from .utils import assert_paths_equal, assert_vol
@@ -30,6 +31,12 @@ def invalid_config(
         load_config(config_text=config_text)
 
 
+def backdate(path: Path, seconds: int = 60) -> None:
+    """Set the mtime of a file into the past, so it is eligible for caching"""
+    t = os.stat(path).st_mtime - seconds
+    os.utime(path, (t, t))
+
+
 class TestCommonScriptSchema:
     def test_simple(self) -> None:
         """Simple form: value is a string"""
@@ -69,6 +76,20 @@ class TestCommonScriptSchema:
             scuba.config._process_script_node(node, "dontcare")
 
 
+def test_split_args_matches_shlex() -> None:
+    """_split_args splits the same way as shlex.split"""
+    for s in (
+        "",
+        "one",
+        "one two",
+        "  one \t two\n",
+        '"one two" three',
+        "one\\ two three",
+        "'one' \"two\"",
+    ):
+        assert scuba.config._split_args(s) == shlex.split(s)
+
+
 @pytest.mark.usefixtures("in_tmp_path")
 class ConfigTest:
     pass
@@ -113,6 +134,35 @@ class TestFindConfig(ConfigTest):
         assert_paths_equal(path, in_tmp_path)
         assert_paths_equal(rel, subdir)
 
+    def test_find_config_stops_at_mount_point(
+        self, in_tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """find_config doesn't search beyond a filesystem boundary"""
+        SCUBA_YML.write_text("image: bosybux")
+
+        subdir = Path("subdir")
+        subdir.mkdir()
+        os.chdir(subdir)
+
+        # Pretend subdir is a mount point
+        real_stat = os.stat
+
+        def fake_stat(path: Any, *args: Any, **kwargs: Any) -> os.stat_result:
+            st = real_stat(path, *args, **kwargs)
+            if Path(path) == in_tmp_path:
+                return os.stat_result((st[0], st[1], st[2] + 1, *st[3:]))
+            return st
+
+        monkeypatch.setattr(os, "stat", fake_stat)
+
+        with pytest.raises(scuba.config.ConfigNotFoundError, match="mount point"):
+            scuba.config.find_config()
+
+        monkeypatch.setenv("SCUBA_DISCOVERY_ACROSS_FILESYSTEM", "1")
+        path, rel, _ = scuba.config.find_config()
+        assert_paths_equal(path, in_tmp_path)
+        assert_paths_equal(rel, subdir)
+
     def test_find_config_nonexist(self) -> None:
         """find_config raises ConfigError if the config cannot be found"""
         with pytest.raises(scuba.config.ConfigError):
@@ -135,6 +185,11 @@ class TestLoadConfig(ConfigTest):
             """
         )
 
+    def test_load_config_not_mapping(self) -> None:
+        """load_config raises ConfigError if the config is not a mapping"""
+        invalid_config(config_text="debian:8.2", error_match="must be a mapping")
+        invalid_config(config_text="- image", error_match="must be a mapping")
+
     def test_load_config_minimal(self) -> None:
         """load_config loads a minimal config"""
         config = load_config(config_text="image: bosybux")
@@ -154,6 +209,21 @@ class TestLoadConfig(ConfigTest):
         assert len(config.aliases) == 2
         assert config.aliases["foo"].script == ["bar"]
         assert config.aliases["snap"].script == ["crackle pop"]
+        assert config.aliases["snap"].single_line_prefix == "crackle pop "
+
+    def test_load_config_multiline_alias_no_prefix(self) -> None:
+        """load_config does not give multi-line aliases a single-line prefix"""
+        config = load_config(
+            config_text="""
+            image: bosybux
+            aliases:
+              foo:
+                script:
+                  - bar
+                  - baz
+            """
+        )
+        assert config.aliases["foo"].single_line_prefix is None
 
     def test_load_config__no_spaces_in_aliases(self) -> None:
         """load_config refuses spaces in aliases"""
@@ -229,10 +299,122 @@ class TestLoadConfig(ConfigTest):
 
         # Assert that GITLAB_YML was only opened once
         assert m.mock_calls == [
-            mock.call(SCUBA_YML, "r"),
-            mock.call(GITLAB_YML, "r"),
+            mock.call(SCUBA_YML, "rb"),
+            mock.call(GITLAB_YML, "rb"),
         ]
 
+    def test_load_config_from_yaml_cached_across_loads(self) -> None:
+        """load_config reuses documents cached by a previous load"""
+        GITLAB_YML.write_text("image: dummian:8.2")
+        SCUBA_YML.write_text(f"image: !from_yaml {GITLAB_YML} image")
+        backdate(GITLAB_YML)
+        backdate(SCUBA_YML)
+        load_config()
+
+        with mock.patch.object(Path, "open", autospec=True, side_effect=Path.open) as m:
+            config = load_config()
+
+        assert config.image == "dummian:8.2"
+        assert m.mock_calls == []
+
+    def test_load_config_cache_invalidated(self) -> None:
+        """load_config reloads a cached config after it changes"""
+        SCUBA_YML.write_text("image: dummian:8.2")
+        backdate(SCUBA_YML)
+        assert load_config().image == "dummian:8.2"
+
+        SCUBA_YML.write_text("image: dummian:9.3")
+        backdate(SCUBA_YML, 30)
+        assert load_config().image == "dummian:9.3"
+
+    def test_load_config_from_yaml_cache_invalidated(self) -> None:
+        """load_config reloads a cached !from_yaml file after it changes"""
+        other_yml = Path(".other.yml")
+        other_yml.write_text("image: dummian:8.2")
+        GITLAB_YML.write_text(f"image: !from_yaml {other_yml} image")
+        SCUBA_YML.write_text(f"image: !from_yaml {GITLAB_YML} image")
+        for path in (other_yml, GITLAB_YML, SCUBA_YML):
+            backdate(path)
+        assert load_config().image == "dummian:8.2"
+
+        # Modify the nested document only
+        other_yml.write_text("image: dummian:9.3")
+        backdate(other_yml, 30)
+        assert load_config().image == "dummian:9.3"
+
+    def test_load_config_override_from_yaml_cache_invalidated(self) -> None:
+        """load_config reloads a !from_yaml file referenced by a nested !override"""
+        args_yml = Path("args.yml")
+        args_yml.write_text("args: --privileged")
+        GITLAB_YML.write_text(f"args: !override '!from_yaml {args_yml} args'")
+        SCUBA_YML.write_text(f"docker_args: !from_yaml {GITLAB_YML} args")
+        for path in (args_yml, GITLAB_YML, SCUBA_YML):
+            backdate(path)
+        assert load_config().docker_args == ["--privileged"]
+
+        # Modify the document referenced by !override only
+        args_yml.write_text("args: -v /tmp/:/tmp/")
+        backdate(args_yml, 30)
+        assert load_config().docker_args == ["-v", "/tmp/:/tmp/"]
+
+    def test_load_config_override_cache_invalidated(self) -> None:
+        """load_config reloads a cached config after a file used by !override changes"""
+        args_yml = Path("args.yml")
+        args_yml.write_text("args: --privileged")
+        SCUBA_YML.write_text(f"docker_args: !override '!from_yaml {args_yml} args'")
+        for path in (args_yml, SCUBA_YML):
+            backdate(path)
+        assert load_config().docker_args == ["--privileged"]
+
+        args_yml.write_text("args: -v /tmp/:/tmp/")
+        backdate(args_yml, 30)
+        assert load_config().docker_args == ["-v", "/tmp/:/tmp/"]
+
+    def test_load_config_from_yaml_deps_unique(self) -> None:
+        """load_config records a document referenced many times as one dependency"""
+        GITLAB_YML.write_text("image: dummian:8.2\nshell: /bin/bash")
+        SCUBA_YML.write_text(
+            f"""
+            image: !from_yaml {GITLAB_YML} image
+            shell: !from_yaml {GITLAB_YML} shell
+            """
+        )
+        for path in (GITLAB_YML, SCUBA_YML):
+            backdate(path)
+        load_config()
+
+        deps, _ = scuba.config.Loader._cache[os.path.abspath(SCUBA_YML)]
+        assert [dep[0] for dep in deps] == [
+            os.path.abspath(SCUBA_YML),
+            os.path.abspath(GITLAB_YML),
+        ]
+
+    def test_load_config_recently_modified_not_cached(self) -> None:
+        """load_config doesn't reuse a config modified too recently to detect changes"""
+        SCUBA_YML.write_text("image: dummian:8.2")
+        assert load_config().image == "dummian:8.2"
+
+        # Same size, and possibly the same mtime
+        SCUBA_YML.write_text("image: dummian:9.3")
+        assert load_config().image == "dummian:9.3"
+
+    def test_load_config_cached_data_unmodified(self) -> None:
+        """load_config doesn't share its result with later loads"""
+        SCUBA_YML.write_text(
+            """
+            image: dummian:8.2
+            aliases:
+              foo:
+                script:
+                  - echo foo
+            """
+        )
+        backdate(SCUBA_YML)
+        config = load_config()
+        config.aliases["foo"].script.append("echo bar")
+
+        assert load_config().aliases["foo"].script == ["echo foo"]
+
     def test_load_config_image_from_yaml_nested_key_missing(self) -> None:
         """load_config raises ConfigError when !from_yaml references nonexistant key"""
         GITLAB_YML.write_text(
@@ -630,6 +812,69 @@ class TestConfigDockerArgs(ConfigTest):
             config.aliases["testalias"].docker_args, scuba.config.OverrideMixin
         )
 
+    def test_alias_docker_args_override_plain_scalar(self) -> None:
+        """docker_args can be tagged for override with a plain scalar"""
+        config = load_config(
+            config_text=r"""
+            image: na
+            docker_args: -v /tmp/:/tmp/
+            aliases:
+              testalias:
+                docker_args: !override --privileged
+                script:
+                  - ugh
+            """
+        )
+        assert config.aliases["testalias"].docker_args == ["--privileged"]
+        assert isinstance(
+            config.aliases["testalias"].docker_args, scuba.config.OverrideMixin
+        )
+
+    def test_alias_docker_args_override_non_ascii(self) -> None:
+        """!override content outside printable ASCII is parsed as YAML"""
+        config = load_config(
+            config_text=r"""
+            image: na
+            aliases:
+              testalias:
+                docker_args: !override "\ufeff--privileged\x85-t"
+                script:
+                  - ugh
+            """
+        )
+        # The BOM is stripped, and NEL is a line break
+        assert config.aliases["testalias"].docker_args == ["--privileged", "-t"]
+
+        # Non-printable characters are rejected
+        invalid_config(
+            config_text=r"""
+            image: na
+            aliases:
+              testalias:
+                docker_args: !override "--privileged\a"
+                script:
+                  - ugh
+            """
+        )
+
+    def test_alias_docker_args_override_null(self) -> None:
+        """docker_args can be overridden with an explicit null value"""
+        config = load_config(
+            config_text=r"""
+            image: na
+            docker_args: --privileged
+            aliases:
+              testalias:
+                docker_args: !override null
+                script:
+                  - ugh
+            """
+        )
+        assert config.aliases["testalias"].docker_args == []
+        assert isinstance(
+            config.aliases["testalias"].docker_args, scuba.config.OverrideMixin
+        )
+
     def test_alias_docker_args_override_implicit_null(self) -> None:
         """docker_args can be overridden with an implicit null value"""
         config = load_config(
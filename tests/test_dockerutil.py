@@ -1,7 +1,7 @@
 from pathlib import Path
 import pytest
 import subprocess
-from typing import Sequence
+from typing import Any, Iterator, Sequence
 from unittest import mock
 
 from .const import ALT_DOCKER_IMAGE, DOCKER_IMAGE
@@ -9,6 +9,14 @@ from .const import ALT_DOCKER_IMAGE, DOCKER_IMAGE
 import scuba.dockerutil as uut
 
 
+@pytest.fixture(autouse=True)
+def clear_image_config_cache() -> Iterator[None]:
+    """Don't share cached image configs between tests"""
+    uut._inspect_image_config.cache_clear()
+    yield
+    uut._inspect_image_config.cache_clear()
+
+
 def test_get_image_command_success() -> None:
     """get_image_command works"""
     assert uut.get_image_command(DOCKER_IMAGE)
@@ -33,14 +41,58 @@ def test_get_image_no_docker() -> None:
             uut.get_image_command("n/a")
 
 
-def _test_get_images(stdout: str, returncode: int = 0) -> Sequence[str]:
+def _mock_run_docker(
+    stdout: bytes, returncodes: Sequence[int] = (0,), stderr: bytes = b""
+) -> Any:
+    """Patch subprocess.run to return stdout, with each of returncodes in turn"""
+    returncodes_iter = iter(returncodes)
+
     def mocked_run(*args, **kwargs):  # type: ignore[no-untyped-def]
         mock_obj = mock.MagicMock()
-        mock_obj.returncode = returncode
+        mock_obj.returncode = next(returncodes_iter)
         mock_obj.stdout = stdout
+        mock_obj.stderr = stderr
         return mock_obj
 
-    with mock.patch("subprocess.run", side_effect=mocked_run) as run_mock:
+    return mock.patch("subprocess.run", side_effect=mocked_run)
+
+
+def test_get_image_config_cached() -> None:
+    """get_image_command and get_image_entrypoint share one docker inspect"""
+    with _mock_run_docker(b'["sh"]\x1fnull\n') as run_mock:
+        assert uut.get_image_command("scuba/inspect-cache-test") == ("sh",)
+        assert uut.get_image_entrypoint("scuba/inspect-cache-test") is None
+
+    assert run_mock.call_count == 1
+
+
+def test_get_image_config_bad_output() -> None:
+    """get_image_command raises DockerError for unexpected docker inspect output"""
+    with _mock_run_docker(b"garbage\n"):
+        with pytest.raises(uut.DockerError):
+            uut.get_image_command("scuba/inspect-bad-output-test")
+
+
+def test_get_image_command_no_such_image() -> None:
+    """get_image_command pulls an image reported missing by docker inspect"""
+    with _mock_run_docker(
+        b'["sh"]\x1fnull\n',
+        returncodes=[1, 0, 0],
+        stderr=b"Error: No such image: scuba/inspect-pull-test\n",
+    ) as run_mock:
+        assert uut.get_image_command("scuba/inspect-pull-test") == ("sh",)
+
+    assert [c.args[0][1] for c in run_mock.call_args_list] == [
+        "inspect",
+        "pull",
+        "inspect",
+    ]
+
+
+def _test_get_images(
+    stdout: str, returncode: int = 0, stderr: str = ""
+) -> Sequence[str]:
+    with _mock_run_docker(stdout.encode(), [returncode], stderr.encode()):
         return uut.get_images()
 
 
@@ -75,8 +127,8 @@ dummy/crackle:pop
 
 def test_get_images__failure() -> None:
     """get_images fails because of error"""
-    with pytest.raises(uut.DockerError):
-        _test_get_images("This is a pre-canned error", 1)
+    with pytest.raises(uut.DockerError, match="pre-canned error"):
+        _test_get_images("", 1, stderr="This is a pre-canned error")
 
 
 def test__get_image_command__pulls_image_if_missing() -> None:
@@ -96,7 +148,7 @@ def test__get_image_command__pulls_image_if_missing() -> None:
 def test_get_image_entrypoint() -> None:
     """get_image_entrypoint works"""
     result = uut.get_image_entrypoint("scuba/entrypoint-test")
-    assert result == ["/entrypoint.sh"]
+    assert result == ("/entrypoint.sh",)
 
 
 def test_get_image_entrypoint__none() -> None:
@@ -10,7 +10,7 @@ import subprocess
 import sys
 from tempfile import TemporaryFile, NamedTemporaryFile
 from textwrap import dedent
-from typing import cast, IO, List, Optional, Sequence, TextIO, Tuple
+from typing import cast, IO, List, Optional, TextIO, Tuple
 from unittest import mock
 import warnings
 
@@ -132,16 +132,16 @@ class TestMainBasic(MainTest):
         # ScubaError -> exit(128)
         out, _ = run_scuba([], expect_return=128)
 
-    def test_handle_get_image_command_error(self) -> None:
-        """Verify scuba handles a get_image_command error"""
+    def test_handle_get_image_config_error(self) -> None:
+        """Verify scuba handles a get_image_config error"""
         SCUBA_YML.write_text("image: {DOCKER_IMAGE}")
 
-        def mocked_gic(image: str) -> Optional[Sequence[str]]:
+        def mocked_gic(image: str) -> scuba.dockerutil.ImageConfig:
             raise scuba.dockerutil.DockerError("mock error")
 
         # http://alexmarandon.com/articles/python_mock_gotchas/#patching-in-the-wrong-place
         # http://www.voidspace.org.uk/python/mock/patch.html#where-to-patch
-        with mock.patch("scuba.scuba.get_image_command", side_effect=mocked_gic):
+        with mock.patch("scuba.scuba.get_image_config", side_effect=mocked_gic):
             # DockerError -> exit(128)
             run_scuba([], expect_return=128)
 
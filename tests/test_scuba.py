@@ -114,6 +114,22 @@ class TestScubaContext:
             ["so", "is", "peach"],
         ]
 
+    def test_process_command_multiline_aliases_nested(self) -> None:
+        """process_command flattens nested multiline alias scripts"""
+        cfg = make_config(
+            image="na",
+            aliases=dict(
+                apple=dict(
+                    script=[
+                        "banana",
+                        ["cherry", ["pie"]],
+                    ]
+                ),
+            ),
+        )
+        result = ScubaContext.process_command(cfg, ["apple"])
+        assert result.script == ["banana", "cherry", "pie"]
+
     def test_process_command_multiline_aliases_forbid_user_args(self) -> None:
         """process_command raises ConfigError when args are specified with multiline aliases"""
         cfg = make_config(
@@ -256,6 +272,37 @@ class TestScubaContext:
         )
         assert result.environment == expected
 
+        # The top-level environment is left unmodified
+        assert cfg.environment == dict(
+            AAA="aaa_base",
+            BBB="bbb_base",
+        )
+
+    def test_env_no_alias(self) -> None:
+        """process_command uses the top-level environment for a non-alias command"""
+        cfg = make_config(
+            image="dontcare",
+            environment=dict(
+                AAA="aaa_base",
+            ),
+        )
+        result = ScubaContext.process_command(cfg, ["cmd"])
+        assert result.environment == dict(AAA="aaa_base")
+
+    def test_env_alias_without_env(self) -> None:
+        """process_command uses the top-level environment for an alias without one"""
+        cfg = make_config(
+            image="dontcare",
+            environment=dict(
+                AAA="aaa_base",
+            ),
+            aliases=dict(
+                test="dontcare",
+            ),
+        )
+        result = ScubaContext.process_command(cfg, ["test"])
+        assert result.environment == dict(AAA="aaa_base")
+
     def test_process_command_alias_extends_docker_args(self) -> None:
         """aliases can extend the docker_args"""
         cfg = make_config(
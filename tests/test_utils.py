@@ -3,6 +3,7 @@ from itertools import chain
 import os
 import pytest
 import shlex
+import sys
 from typing import List, Sequence
 
 from .utils import assert_seq_equal
@@ -54,6 +55,12 @@ def test_format_cmdline() -> None:
     )
 
 
+def test_format_cmdline_long_first_arg() -> None:
+    """format_cmdline doesn't emit an empty line before a long first argument"""
+    result = scuba.utils.format_cmdline(["x" * 100, "a", "b"])
+    assert result == "x" * 100 + " \\\na b"
+
+
 def test_shell_quote_cmd() -> None:
     args = ["foo", "bar pop", '"tee ball"']
 
@@ -127,6 +134,15 @@ def test_flatten_list__nested_many() -> None:
     assert_seq_equal(result, exp)
 
 
+def test_flatten_list__deeply_nested() -> None:
+    sample: list = [0]
+    for i in range(1, sys.getrecursionlimit() + 1):
+        sample = [sample, i]
+    exp = range(0, sys.getrecursionlimit() + 1)
+    result = scuba.utils.flatten_list(sample)
+    assert_seq_equal(result, exp)
+
+
 def test_get_umask() -> None:
     testval = 0o123  # unlikely default
     orig = os.umask(testval)